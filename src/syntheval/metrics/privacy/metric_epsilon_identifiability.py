@@ -2,18 +2,104 @@
 # Author: Anton D. Lautrup
 # Date: 23-08-2023
 
+import os
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor
+from threadpoolctl import threadpool_limits
+
 from ..core.metric import MetricClass
 
 from scipy.stats import entropy
 
-from ...utils.nn_distance import _knn_distance
+from ...utils.nn_distance import _knn_distance, _gower_knn1
 
 def _column_entropy(labels):
-        value, counts = np.unique(np.round(labels), return_counts=True)
+        """Entropy of the rounded column values, counted with np.bincount when the 
+        values span a range comparable to the number of rows, else with np.unique"""
+        rounded = np.round(labels)
+        if rounded.size and np.all(np.isfinite(rounded)) and np.ptp(rounded) <= max(4*len(rounded), 2**16):
+            ints = rounded.astype(np.int64)
+            counts = np.bincount(ints - ints.min())
+            counts = counts[counts > 0]
+        else:
+            value, counts = np.unique(rounded, return_counts=True)
         return entropy(counts)
 
+def _entropy_weights(data, cols):
+    """Function for getting the inverse column entropies used to weight the distances"""
+    real = np.asarray(data[cols])
+    W = [_column_entropy(real[:, i]) for i in range(real.shape[1])]
+    return 1/(np.array(W)+1e-16)
+
+_TILE_ELEMENTS = 2**20 # ~8 MB of float64 per distance tile, about half a typical L3 cache
+
+def _min_sq_distances(a, b, weights, skip_self=False, block_size=None, n_workers=None):
+    """Function for finding the weighted squared euclidean distance from each row of a 
+    to its nearest row in b, without materialising the full distance matrix.
+
+    The query axis is processed in tiles of block_size rows, and the nearest row is 
+    found using that ||x-y||^2 = ||x||^2 + ||y||^2 - 2 x.y on the centred rows scaled 
+    by the square root of the weights. This expansion loses precision, so it is only 
+    used for choosing the candidate neighbours, and the distance is recomputed from the 
+    original rows as sum(weights*(x-y)^2), as in sklearn's weighted minkowski. If 
+    skip_self is True, a and b are the same data and the row itself is skipped. 
+    Duplicate rows share their nearest neighbour, so only the unique rows are compared.
+
+    Tiles are processed concurrently by n_workers threads (default: number of CPUs),
+    with BLAS limited to one thread per tile to avoid oversubscription.
+    """
+    a, a_inv, a_counts = np.unique(a, axis=0, return_inverse=True, return_counts=True)
+    b = a if skip_self else np.unique(b, axis=0)
+
+    n_a, n_b = len(a), len(b)
+    if block_size is None:
+        block_size = int(max(1, min(1024, _TILE_ELEMENTS // max(n_b, 1))))
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    # centring on a limits the cancellation in the GEMM, the arrays are made C-contiguous
+    # as dataframe values are often column-major
+    offset = a.mean(axis=0)
+    a_hat = np.ascontiguousarray((a - offset) * np.sqrt(weights), dtype=float)
+    b_hat = a_hat if skip_self else np.ascontiguousarray((b - offset) * np.sqrt(weights), dtype=float)
+    a_norms = np.einsum('ij,ij->i', a_hat, a_hat)
+    b_norms = a_norms if skip_self else np.einsum('ij,ij->i', b_hat, b_hat)
+
+    min_dists = np.empty(n_a)
+    def process_tile(i):
+        a_block = a_hat[i:i+block_size]
+        d = b_norms[None, :] - 2*np.dot(a_block, b_hat.T)
+        d += a_norms[i:i+block_size, None]
+        if skip_self:
+            rows = np.arange(len(a_block))
+            d[rows, i+rows] = np.inf
+
+        # the expansion can not tell near ties apart, so every row within its rounding
+        # error of the minimum is a candidate for the exact distance
+        idx = d.argmin(axis=1)
+        m = d[np.arange(len(a_block)), idx]
+        tol = 1e-9*(a_norms[i:i+block_size] + b_norms[idx])
+        rows, cols = np.divmod(np.flatnonzero(d <= (m + tol)[:, None]), n_b)
+        exact = np.zeros(len(rows))
+        for k in range(a.shape[1]):
+            exact += weights[k]*(a[i+rows, k] - b[cols, k])**2
+
+        tile_min = np.full(len(a_block), np.inf)
+        np.minimum.at(tile_min, rows, exact)
+        min_dists[i:i+block_size] = tile_min
+
+    starts = range(0, n_a, block_size)
+    if n_workers > 1 and len(starts) > 1:
+        with threadpool_limits(limits=1, user_api='blas'), ThreadPoolExecutor(max_workers=n_workers) as ex:
+            list(ex.map(process_tile, starts))
+    else:
+        for i in starts: process_tile(i)
+
+    # a row with a duplicate has a neighbour at distance zero
+    if skip_self: min_dists[a_counts > 1] = 0
+    return min_dists[a_inv]
+
 class EpsilonIdentifiability(MetricClass):
     """The Metric Class is an abstract class that interfaces with 
     SynthEval. When initialised the class has the following attributes:
@@ -46,25 +132,35 @@ class EpsilonIdentifiability(MetricClass):
         IEEE Journal of Biomedical and Health Informatics, 24(8), 2378–2388. [doi:10.1109/JBHI.2020.2980262] 
         """
 
-        if self.nn_dist == 'euclid':
-            self.real_data = self.real_data[self.num_cols]
-            self.synt_data = self.synt_data[self.num_cols] 
-
-        real = np.asarray(self.real_data)
+        cols = self.num_cols if self.nn_dist == 'euclid' else list(self.real_data.columns)
+        W_adjust = _entropy_weights(self.real_data, cols)
 
-        no, x_dim = np.shape(real)
-        W = [_column_entropy(real[:, i]) for i in range(x_dim)]
-        W_adjust = 1/(np.array(W)+1e-16)
+        real = self.real_data[cols].to_numpy()
+        synt = self.synt_data[cols].to_numpy()
+        no = len(real)
 
-        # for i in range(x_dim):
-        #     real_hat[:, i] = real[:, i] * 1. / W[i]
-        #     fake_hat[:, i] = fake[:, i] * 1. / W[i]
-
-        in_dists = _knn_distance(self.real_data,self.real_data,self.cat_cols,1,self.nn_dist,W_adjust)[0]
-        ext_distances = _knn_distance(self.real_data,self.synt_data,self.cat_cols,1,self.nn_dist,W_adjust)[0]
-
-        R_Diff = ext_distances - in_dists
-        identifiability_value = np.sum(R_Diff < 0) / float(no)
+        if self.nn_dist == 'euclid':
+            real, synt = real.astype(float), synt.astype(float)
+            if not (np.isfinite(real).all() and np.isfinite(synt).all()):
+                raise ValueError("Input contains NaN or infinity, which the euclidean distance does not accept")
+
+            # the square root is taken as in sklearn, since its rounding can merge close distances
+            in_dists = np.sqrt(_min_sq_distances(real, real, W_adjust, skip_self=True))
+
+            if np.array_equal(real, synt):
+                ext_distances = in_dists
+            else:
+                ext_distances = np.sqrt(_min_sq_distances(real, synt, W_adjust))
+        elif self.nn_dist == 'gower':
+            bool_cat_cols = [col in self.cat_cols for col in cols]
+            in_dists = _gower_knn1(real, real, bool_cat_cols, W_adjust)
+            ext_distances = _gower_knn1(real, synt, bool_cat_cols, W_adjust)
+        else:
+            cat_idx = [i for i, col in enumerate(cols) if col in self.cat_cols]
+            in_dists = _knn_distance(real,real,cat_idx,1,self.nn_dist,W_adjust)[0]
+            ext_distances = _knn_distance(real,synt,cat_idx,1,self.nn_dist,W_adjust)[0]
+
+        identifiability_value = np.sum(ext_distances < in_dists) / float(no)
 
         self.results['eps_risk'] = identifiability_value
         return self.results
@@ -7,35 +7,90 @@ import pandas as pd
 
 from ..core.metric import MetricClass
 
-from scipy.stats import chi2_contingency
+from joblib import Parallel, delayed
 from ...utils.plot_metrics import plot_matrix_heatmap
 
+try:
+    from ...utils.cramers_numba import pairwise_cramers
+except ImportError:
+    pairwise_cramers = None
+
 def _cramers_V(var1,var2) :
-    """function for calculating Cramers V between two categorial variables
+    """function for calculating Cramers V between two categorial variables,
+    given as factorized integer codes (see pd.factorize)
     credit: https://www.kaggle.com/code/chrisbss1/cramer-s-v-correlation-matrix
     """
-    crosstab =np.array(pd.crosstab(var1, var2, rownames=None, colnames=None)) # Cross table building
-    stat = chi2_contingency(crosstab)[0] # Keeping of the test statistic of the Chi2 test
+    known = (var1 >= 0) & (var2 >= 0) # missing categories are coded -1, pd.crosstab dropped these rows
+    var1, var2 = var1[known], var2[known]
+    if len(var1) == 0: return 0.0
+
+    k1, k2 = np.max(var1)+1, np.max(var2)+1
+    crosstab = np.bincount(var1*k2+var2, minlength=k1*k2).reshape(k1,k2) # Cross table building
+    crosstab = crosstab[crosstab.sum(axis=1) > 0][:, crosstab.sum(axis=0) > 0] # Only categories that occur
+    k1, k2 = crosstab.shape
     obs = np.sum(crosstab) # Number of observations
     mini = min(crosstab.shape)-1 # Take the minimum value between the columns and the rows of the cross table
+    if mini == 0: return 0.0
+
+    # Chi2 test statistic, equal to chi2_contingency(crosstab)[0] with its default Pearson statistic
+    # and Yates' correction (which only applies to 2x2 tables), but without the p-value
+    expected = np.outer(crosstab.sum(axis=1), crosstab.sum(axis=0))/obs
+    if (k1-1)*(k2-1) == 1: # Yates' correction for 2x2 tables
+        diff = expected - crosstab
+        crosstab = crosstab + np.sign(diff)*np.minimum(0.5, np.abs(diff))
+    stat = np.sum((crosstab-expected)**2/expected)
     return (stat/(obs*mini+1e-16))
 
-def _apply_mat(data,func,labs1,labs2):
-    """Help function for constructing a matrix based on func accross labels 1 and 2"""
-    res = (func(data[lab1],data[lab2]) for lab1 in labs1 for lab2 in labs2)
-    return pd.DataFrame(np.fromiter(res, dtype=float).reshape(len(labs1),len(labs2)), columns = labs2, index = labs1)
+def _apply_mat(data,func,labs1,labs2,n_jobs=-1):
+    """Help function for constructing a matrix (as array) based on func accross labels 1 and 2,
+    data can be a DataFrame or a dictionary of arrays keyed by the labels.
+
+    If labs1 is labs2, func is assumed symmetric and only the upper triangle is computed,
+    the diagonal is set to one. The cells are evaluated in parallel over n_jobs threads,
+    or directly in a loop if n_jobs is 1."""
+    symmetric = labs1 is labs2
+    cols1 = [data[lab] for lab in labs1]
+    cols2 = cols1 if symmetric else [data[lab] for lab in labs2]
+    if isinstance(data, pd.DataFrame):
+        cols1 = [col.to_numpy() for col in cols1]
+        cols2 = cols1 if symmetric else [col.to_numpy() for col in cols2]
+
+    res = np.eye(len(labs1)) if symmetric else np.empty((len(labs1),len(labs2)))
+    if n_jobs == 1:
+        for i, col_a in enumerate(cols1):
+            for j in range(i+1 if symmetric else 0, len(cols2)):
+                res[i,j] = func(col_a,cols2[j])
+                if symmetric: res[j,i] = res[i,j]
+        return res
+
+    pairs = [(i,j) for i in range(len(cols1)) for j in range(i+1 if symmetric else 0, len(cols2))]
+    vals = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(func)(cols1[i],cols2[j]) for i, j in pairs)
+    for (i, j), val in zip(pairs, vals):
+        res[i,j] = val
+        if symmetric: res[j,i] = val
+    return res
+
+def _cramers_V_mat(codes,cat_cols):
+    """Help function for constructing the Cramer's V matrix from the factorized columns,
+    using the numba kernel if available"""
+    if pairwise_cramers is not None:
+        return pairwise_cramers([codes[lab] for lab in cat_cols])
+    return _apply_mat(codes,_cramers_V,cat_cols,cat_cols)
+
+def _factorize_columns(data, cols):
+    """Help function for factorizing the categorical columns into integer codes"""
+    return {lab: pd.factorize(data[lab])[0] for lab in cols}
 
 def _correlation_ratio(categories, measurements):
     """Function for calculating the correlation ration eta^2 of categorial and nummerical data"""
     fcat, _ = pd.factorize(categories)
+    measurements = np.asarray(measurements, dtype=float)
     cat_num = np.max(fcat)+1
-    y_avg_array = np.zeros(cat_num)
-    n_array = np.zeros(cat_num)
-    for i in range(0,cat_num):
-        cat_measures = measurements[np.argwhere(fcat == i).flatten()]
-        n_array[i] = len(cat_measures)
-        y_avg_array[i] = np.average(cat_measures)
-    y_total_avg = np.sum(np.multiply(y_avg_array,n_array))/np.sum(n_array)
+    known = fcat >= 0 # missing categories are coded -1 and left out of the category averages
+    n_array = np.bincount(fcat[known], minlength=cat_num).astype(float)
+    sums = np.bincount(fcat[known], weights=measurements[known], minlength=cat_num)
+    y_avg_array = sums/np.maximum(n_array,1)
+    y_total_avg = np.sum(sums)/np.sum(n_array)
     numerator = np.sum(np.multiply(n_array,np.power(np.subtract(y_avg_array,y_total_avg),2)))
     denominator = np.sum(np.power(np.subtract(measurements,y_total_avg),2))
     if numerator == 0:
@@ -44,19 +99,36 @@ def _correlation_ratio(categories, measurements):
         eta = numerator/denominator
     return eta
 
+def _mixed_correlation(data,num_cols,cat_cols):
+    """Help function for assembling the mixed correlation matrix as an array,
+    with the categorical columns first"""
+    n, m = len(cat_cols), len(num_cols)
+    codes = _factorize_columns(data, cat_cols)
+
+    corr = np.empty((n+m,n+m))
+    corr[:n,:n] = _cramers_V_mat(codes,cat_cols)
+    corr[:n,n:] = _apply_mat(data,_correlation_ratio,cat_cols,num_cols)
+    corr[n:,:n] = corr[:n,n:].T
+    corr[n:,n:] = data[num_cols].corr().to_numpy()
+    np.fill_diagonal(corr, 1)
+    return corr
+
 def mixed_correlation(data,num_cols,cat_cols):
     """Function for calculating a correlation matrix of mixed datatypes.
     Spearman's rho is used for rank-based correlation, Cramer's V is used for categorical variables, 
     and correlation ratio is used for categorical and continuous variables.
     """
-    corr_num_num = data[num_cols].corr()
-    corr_cat_cat = _apply_mat(data,_cramers_V,cat_cols,cat_cols)
-    corr_cat_num = _apply_mat(data,_correlation_ratio,cat_cols,num_cols)
+    labs = list(cat_cols) + list(num_cols)
+    return pd.DataFrame(_mixed_correlation(data,num_cols,cat_cols), index = labs, columns = labs)
 
-    top_row = pd.concat([corr_cat_cat,corr_cat_num],axis=1)
-    bot_row = pd.concat([corr_cat_num.transpose(),corr_num_num],axis=1)
-    corr = pd.concat([top_row,bot_row],axis=0)
-    return corr + np.diag(1-np.diag(corr))
+def _mixed_correlation_diff(real,synt,num_cols,cat_cols):
+    """Function for calculating the Frobenius norm of the difference between the mixed 
+    correlation matrices of real and synt. The matrices are compared as arrays, without
+    the DataFrame arithmetic of mixed_correlation.
+    """
+    r_corr = _mixed_correlation(real,num_cols,cat_cols)
+    s_corr = _mixed_correlation(synt,num_cols,cat_cols)
+    return np.linalg.norm(r_corr - s_corr, ord='fro')
 
 class MixedCorrelation(MetricClass):
     """The Metric Class is an abstract class that interfaces with 
@@ -86,8 +158,13 @@ class MixedCorrelation(MetricClass):
         This calculation uses spearmans rho for numerical-numerical, Cramer's V for categories,
         and correlation ratio (eta) for numerical-categorials.
         
-        Mixed mode can be disabled, to only use the numerical variables."""
+        Mixed mode can be disabled, to only use the numerical variables. If the matrices are 
+        neither returned nor plotted, they are compared as arrays."""
         self.mixed_corr = mixed_corr
+        if mixed_corr and not (return_mats or self.verbose):
+            self.results = {'corr_mat_diff': _mixed_correlation_diff(self.real_data,self.synt_data,self.num_cols,self.cat_cols)}
+            return self.results
+
         if mixed_corr:
             r_corr = mixed_correlation(self.real_data,self.num_cols,self.cat_cols)
             f_corr = mixed_correlation(self.synt_data,self.num_cols,self.cat_cols)
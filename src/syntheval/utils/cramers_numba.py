@@ -0,0 +1,56 @@
+# Description: Numba kernel for the pairwise Cramer's V matrix (requires numba)
+# Author: Tobias Hyrup
+# Date: 14-10-2026
+
+import numpy as np
+
+from numba import njit, prange
+
+@njit(parallel=True, cache=True)
+def _pairwise_cramers(codes, ks):
+    n, k = codes.shape
+    out = np.eye(k)
+    for a in prange(k):
+        for b in range(a+1, k):
+            ka, kb = ks[a], ks[b]
+            tab = np.zeros((ka, kb))
+            for r in range(n):
+                # missing categories are coded -1, these rows are dropped as in pd.crosstab
+                if codes[r,a] >= 0 and codes[r,b] >= 0:
+                    tab[codes[r,a], codes[r,b]] += 1
+            rows = tab.sum(axis=1)
+            cols = tab.sum(axis=0)
+            obs = rows.sum()
+
+            # only categories that occur count towards the table shape
+            n_rows = np.sum(rows > 0)
+            n_cols = np.sum(cols > 0)
+            mini = min(n_rows, n_cols)-1
+            if mini <= 0:
+                out[a,b] = out[b,a] = 0.0
+                continue
+
+            stat = 0.0
+            for i in range(ka):
+                for j in range(kb):
+                    if rows[i] == 0 or cols[j] == 0:
+                        continue
+                    expected = rows[i]*cols[j]/obs
+                    diff = tab[i,j] - expected
+                    if n_rows == 2 and n_cols == 2: # Yates' correction for 2x2 tables
+                        diff = np.sign(diff)*max(abs(diff)-0.5, 0.0)
+                    stat += diff*diff/expected
+            out[a,b] = out[b,a] = stat/(obs*mini+1e-16)
+    return out
+
+def pairwise_cramers(codes):
+    """Function for calculating the Cramer's V matrix of a list of factorized categorical
+    columns (see pd.factorize), with the diagonal set to one. Gives the same values as
+    applying _cramers_V from the mixed correlation metric on each pair of columns."""
+    codes = [np.asarray(c) for c in codes]
+    n = len(codes[0]) if codes else 0
+    mat = np.empty((n, len(codes)), dtype=np.int32, order='F')
+    for i, c in enumerate(codes):
+        mat[:,i] = c
+    ks = np.array([max(c.max()+1, 1) if n else 1 for c in codes], dtype=np.int64)
+    return _pairwise_cramers(mat, ks)
@@ -5,9 +5,15 @@
 import gower
 
 import numpy as np
+import pandas as pd
 
 from sklearn.neighbors import NearestNeighbors
 
+try:
+    from .nn_distance_numba import knn1_mixed as _knn1_mixed_numba
+except ImportError:
+    _knn1_mixed_numba = None
+
 def _create_matrix_with_ones(indices, num_rows):
     matrix = np.zeros((len(indices),num_rows), dtype=int)
     for i, index in enumerate(indices):
@@ -15,6 +21,9 @@ def _create_matrix_with_ones(indices, num_rows):
     return matrix
 
 def _knn_distance(a, b, cat_cols, num, metric='gower', weights=None):
+    """Function for finding the distances to the num nearest neighbours in b for each row in a.
+    a and b can be DataFrames, with cat_cols as column names, or arrays, with cat_cols as 
+    column positions."""
     def gower_knn(a, b, bool_cat_cols):
             """Function used for finding nearest neighbours"""
             d = []
@@ -47,12 +56,77 @@ def _knn_distance(a, b, cat_cols, num, metric='gower', weights=None):
             return d
 
     if metric=='gower':
-        bool_cat_cols = [col1 in cat_cols for col1 in a.columns]
+        if isinstance(a, pd.DataFrame):
+            bool_cat_cols = [col1 in cat_cols for col1 in a.columns]
+        else:
+            bool_cat_cols = [i in cat_cols for i in range(np.shape(a)[1])]
         return gower_knn(a,b,bool_cat_cols)
     if metric=='euclid':
         return eucledian_knn(a,b)
     else: raise Exception("Unknown metric; options are 'gower' or 'euclid'")
 
+_TILE_ELEMENTS = 2**20
+
+def _knn1_mixed(X_num, Y_num, X_cat, Y_cat, W_num, R_num, W_cat, skip_self=False):
+    """Function for finding the distance to the nearest neighbour in Y for each row of X,
+    using the weighted sum of range normalised absolute differences on the numerical
+    features and of mismatches on the categorical features. If skip_self is True, X and 
+    Y are the same data and the row itself is skipped. Distances that are NaN are skipped."""
+    n_x, n_y = len(X_num), len(Y_num)
+    block_size = int(max(1, _TILE_ELEMENTS // max(n_y, 1)))
+    out = np.empty(n_x)
+    for i in range(0, n_x, block_size):
+        X_num_block, X_cat_block = X_num[i:i+block_size], X_cat[i:i+block_size]
+        d = np.zeros((len(X_num_block), n_y))
+        for k in range(X_num.shape[1]):
+            d += W_num[k]*(np.abs(X_num_block[:, k, None] - Y_num[None, :, k])/R_num[k])
+        for k in range(X_cat.shape[1]):
+            d += W_cat[k]*(X_cat_block[:, k, None] != Y_cat[None, :, k])
+        d[np.isnan(d)] = np.inf
+        if skip_self:
+            rows = np.arange(len(d))
+            d[rows, i+rows] = np.inf
+        out[i:i+block_size] = d.min(axis=1, initial=np.inf)
+    return out
+
+def _gower_knn1(a, b, bool_cat_cols, weights=None):
+    """Function for finding the Gower distance to the nearest neighbour in b for each 
+    row in a, without materialising the full distance matrix. Uses the numba kernel in
+    nn_distance_numba if numba is installed, which gives identical results.
+
+    Follows the normalisation of gower.gower_matrix, but differs from 
+    _knn_distance(a, b, cat_cols, 1, 'gower', weights)[0] in two ways:
+     - gower finds the column ranges and returns the distances in float32, here 
+       everything is computed in float64, such that equal per-feature differences 
+       give equal distances.
+     - gower assumes that the distance matrix is symmetric whenever a and b have the 
+       same number of rows, and only evaluates the upper triangle. Here all pairs are 
+       evaluated, so different datasets of the same length are handled correctly.
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    cat = np.asarray(bool_cat_cols, dtype=bool)
+    if weights is None: weights = np.ones(a.shape[1])
+    weights = np.asarray(weights, dtype=float)
+
+    # gower scales by the max and range of the combined data, |x/max - y/max|/|1 - min/max|,
+    # which is |x - y|/(max - min) evaluated so that equal differences give equal terms.
+    # As in gower, features with zero max or zero range never contribute to the distance
+    Z_num = np.concatenate((a[:,~cat], b[:,~cat]))
+    num_max = np.nan_to_num(np.nanmax(Z_num, axis=0))
+    num_min = np.nan_to_num(np.nanmin(Z_num, axis=0))
+    keep = (num_max != 0) & (num_max != num_min)
+    a_num = np.ascontiguousarray(a[:,~cat][:,keep])
+    b_num = np.ascontiguousarray(b[:,~cat][:,keep])
+
+    args = (a_num, b_num, np.ascontiguousarray(a[:,cat]), np.ascontiguousarray(b[:,cat]),
+            weights[~cat][keep], (num_max - num_min)[keep], weights[cat], np.array_equal(a, b))
+    kernel = _knn1_mixed_numba if _knn1_mixed_numba is not None else _knn1_mixed
+    dists = kernel(*args) / weights.sum()
+
+    # in the self case gower's diagonal is 1, which caps the distances
+    if args[-1]: dists = np.minimum(dists, 1)
+    return dists
+
 # class nn_distance_metric():
 #     def __init__(self, real, fake, cat_cols, metric='euclid'):
 #         self.real = real
@@ -0,0 +1,30 @@
+# Description: Numba kernel for nearest neighbour distances (requires numba)
+# Author: Tobias Hyrup
+# Date: 14-10-2026
+
+import numpy as np
+
+from numba import njit, prange
+
+@njit(parallel=True, cache=True)
+def knn1_mixed(X_num, Y_num, X_cat, Y_cat, W_num, R_num, W_cat, skip_self=False):
+    """Brute force version of nn_distance._knn1_mixed, evaluating the terms in the
+    same order and without fastmath, so that the two give identical distances."""
+    n_x, n_num = X_num.shape
+    n_y, n_cat = Y_cat.shape
+    out = np.empty(n_x)
+    for i in prange(n_x):
+        best = np.inf
+        for j in range(n_y):
+            if skip_self and i == j:
+                continue
+            d = 0.0
+            for k in range(n_num):
+                d += W_num[k]*(abs(X_num[i,k] - Y_num[j,k])/R_num[k])
+            for k in range(n_cat):
+                if X_cat[i,k] != Y_cat[j,k]:
+                    d += W_cat[k]
+            if d < best:
+                best = d
+        out[i] = best
+    return out
@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from syntheval.metrics.privacy.metric_epsilon_identifiability import EpsilonIdentifiability, _entropy_weights
+from syntheval.utils.nn_distance import _knn_distance
+
+def _reference_risk(real, synt, cat_cols, nn_dist):
+    """Epsilon identifiability risk computed directly with _knn_distance"""
+    cols = [col for col in real.columns if col not in cat_cols] if nn_dist == 'euclid' else list(real.columns)
+    W = _entropy_weights(real, cols)
+    cat_idx = [i for i, col in enumerate(cols) if col in cat_cols]
+    a, b = real[cols].to_numpy(), synt[cols].to_numpy()
+    in_dists = _knn_distance(a, a, cat_idx, 1, nn_dist, W)[0]
+    ext_distances = _knn_distance(a, b, cat_idx, 1, nn_dist, W)[0]
+    return np.sum(ext_distances < in_dists) / float(len(a))
+
+def _risk(real, synt, cat_cols, nn_dist):
+    num_cols = [col for col in real.columns if col not in cat_cols]
+    metric = EpsilonIdentifiability(real, synt, cat_cols=cat_cols, num_cols=num_cols, nn_dist=nn_dist, do_preprocessing=False, verbose=False)
+    return metric.evaluate()['eps_risk']
+
+def _tied_data(seed, n_real=300, n_synt=300):
+    """Small integer valued datasets, with many duplicates and tied distances"""
+    rng = np.random.default_rng(seed)
+    k, levels = rng.integers(2, 6), rng.integers(2, 6)
+    scale = rng.choice([0.1, 1, 1000])
+    cols = ['var%d' % i for i in range(k)]
+    real = pd.DataFrame(rng.integers(0, levels, (n_real, k))*scale, columns=cols)
+    synt = pd.DataFrame(rng.integers(0, levels, (n_synt, k))*scale, columns=cols)
+    return real, synt
+
+class TestEuclidRisk(unittest.TestCase):
+    def test_ties(self):
+        for seed in range(20):
+            real, synt = _tied_data(seed)
+            self.assertEqual(_risk(real, synt, [], 'euclid'), _reference_risk(real, synt, [], 'euclid'))
+
+    def test_unequal_lengths(self):
+        for seed in range(5):
+            real, synt = _tied_data(seed, n_synt=250)
+            self.assertEqual(_risk(real, synt, [], 'euclid'), _reference_risk(real, synt, [], 'euclid'))
+
+    def test_same(self):
+        real, _ = _tied_data(0)
+        self.assertEqual(_risk(real, real.copy(), [], 'euclid'), 0.0)
+
+    def test_nan(self):
+        real, synt = _tied_data(0)
+        synt.iloc[3, 1] = np.nan
+        self.assertRaises(ValueError, _risk, real, synt, [], 'euclid')
+        self.assertRaises(ValueError, _reference_risk, real, synt, [], 'euclid')
+
+if __name__ == '__main__':
+    unittest.main()
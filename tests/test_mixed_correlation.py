@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from scipy.stats import chi2_contingency
+
+from syntheval.metrics.utility.metric_mixed_correlation import _apply_mat, _cramers_V, _factorize_columns
+
+try:
+    from syntheval.utils.cramers_numba import pairwise_cramers
+except ImportError:
+    pairwise_cramers = None
+
+def _chi2_cramers_V(var1, var2):
+    """Cramer's V from pd.crosstab and chi2_contingency, as originally implemented"""
+    crosstab = np.array(pd.crosstab(var1, var2, rownames=None, colnames=None))
+    stat = chi2_contingency(crosstab)[0]
+    obs = np.sum(crosstab)
+    mini = min(crosstab.shape)-1
+    return (stat/(obs*mini+1e-16))
+
+def _categorical_data(seed, n=200):
+    """Categorical columns covering 2x2 tables (Yates' correction), missing values and
+    categories that only occur next to missing values"""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'bin1': rng.choice(['a', 'b'], n),
+        'bin2': rng.choice(['x', 'y'], n, p=[0.8, 0.2]),
+        'tri': rng.choice(['p', 'q', 'r'], n),
+        'many': rng.integers(0, 8, n).astype(str),
+        'nan': rng.choice(['u', 'v', 'w', None], n),
+        'const': ['c']*n,
+        })
+    data.loc[data['nan'].isna() & (data['tri'] == 'r'), 'many'] = 'only_with_nan'
+    return data
+
+cat_cols = ['bin1', 'bin2', 'tri', 'many', 'nan', 'const']
+
+class TestCramersV(unittest.TestCase):
+    def test_reference(self):
+        for seed in range(5):
+            data = _categorical_data(seed)
+            codes = _factorize_columns(data, cat_cols)
+            for i, lab1 in enumerate(cat_cols):
+                for lab2 in cat_cols[i+1:]:
+                    self.assertAlmostEqual(_cramers_V(codes[lab1], codes[lab2]), _chi2_cramers_V(data[lab1], data[lab2]), places=12)
+
+@unittest.skipIf(pairwise_cramers is None, "numba is not installed")
+class TestCramersVNumba(unittest.TestCase):
+    def test_parity(self):
+        for seed in range(5):
+            codes = _factorize_columns(_categorical_data(seed), cat_cols)
+            ref = _apply_mat(codes, _cramers_V, cat_cols, cat_cols, n_jobs=1)
+            np.testing.assert_allclose(pairwise_cramers([codes[lab] for lab in cat_cols]), ref, rtol=1e-12, atol=1e-15)
+
+if __name__ == '__main__':
+    unittest.main()
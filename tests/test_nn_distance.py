@@ -0,0 +1,76 @@
+import os
+import unittest
+
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from syntheval.metrics.privacy.metric_epsilon_identifiability import EpsilonIdentifiability
+from syntheval.utils import nn_distance
+from syntheval.utils.nn_distance import _knn_distance, _gower_knn1
+from syntheval.utils.variable_detection import get_cat_variables
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+load_dir = os.path.join(os.path.dirname(__file__), '..', 'guides', 'example')
+
+bool_cat_cols = [False, False, False, True, True]
+
+def _mixed_data(seed, n_a, n_b):
+    """Small integer valued datasets with three numerical and two categorical columns,
+    with many duplicates and tied distances"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 4, (n_a, 5)).astype(float)
+    b = rng.integers(0, 4, (n_b, 5)).astype(float)
+    a[:, 0] *= 10
+    b[:, 0] *= 10
+    return a, b
+
+def _without_numba(func, *args):
+    with mock.patch.object(nn_distance, '_knn1_mixed_numba', None):
+        return func(*args)
+
+class TestGowerKnn1(unittest.TestCase):
+    def test_matches_gower(self):
+        a, b = _mixed_data(0, 200, 150)
+        W = np.array([1, 2, 0.5, 1, 3])
+        ref = _knn_distance(a, b, [3, 4], 1, 'gower', W)[0]
+        self.assertTrue(np.allclose(_gower_knn1(a, b, bool_cat_cols, W), ref, atol=1e-6))
+
+    def test_self(self):
+        a, _ = _mixed_data(1, 200, 0)
+        ref = _knn_distance(a, a, [3, 4], 1, 'gower')[0]
+        self.assertTrue(np.allclose(_gower_knn1(a, a, bool_cat_cols), ref, atol=1e-6))
+
+    def test_equal_lengths(self):
+        # gower only evaluates the upper triangle for inputs of the same length, the
+        # reference appends a duplicate row, which changes neither ranges nor minima
+        a, b = _mixed_data(2, 200, 200)
+        ref = _knn_distance(a, np.vstack((b, b[:1])), [3, 4], 1, 'gower')[0]
+        self.assertTrue(np.allclose(_gower_knn1(a, b, bool_cat_cols), ref, atol=1e-6))
+
+@unittest.skipIf(numba is None, "numba is not installed")
+class TestGowerKnn1Numba(unittest.TestCase):
+    def test_parity(self):
+        for seed in range(5):
+            for n_b in [200, 150]:
+                a, b = _mixed_data(seed, 200, n_b)
+                W = np.random.default_rng(seed).random(5)
+                np.testing.assert_array_equal(_gower_knn1(a, b, bool_cat_cols, W), _without_numba(_gower_knn1, a, b, bool_cat_cols, W))
+            np.testing.assert_array_equal(_gower_knn1(a, a, bool_cat_cols, W), _without_numba(_gower_knn1, a, a, bool_cat_cols, W))
+
+    def test_eps_risk_parity(self):
+        real = pd.read_csv(os.path.join(load_dir, 'hepatitis_train.csv'))
+        synt = pd.read_csv(os.path.join(load_dir, 'hepatitis_BN_syn.csv'))[:len(real)]
+        cat_cols = get_cat_variables(real, threshold=10)
+        num_cols = [col for col in real.columns if col not in cat_cols]
+
+        metric = EpsilonIdentifiability(real, synt, cat_cols=cat_cols, num_cols=num_cols, nn_dist='gower', verbose=False)
+        self.assertEqual(metric.evaluate()['eps_risk'], _without_numba(metric.evaluate)['eps_risk'])
+
+if __name__ == '__main__':
+    unittest.main()